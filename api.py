@@ -1,165 +1,347 @@
+import secrets
 import sys
-import uuid
-from flask import Flask, jsonify, request, render_template
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+from flask import Flask, Response, jsonify, request, render_template
+
+# orjson is optional; when installed it serializes chains much faster
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# waitress is optional; when installed it serves the app instead of the
+# Flask development server
+try:
+    from waitress import serve
+except ImportError:
+    serve = None
 
 # Import the Blockchain class from our other file
 from blockchain import Blockchain
 
+def chain_response(response):
+    """
+    Serializes a response holding chain data, using orjson when it is
+    installed and can encode the payload, and jsonify otherwise.
+    """
+    if orjson is not None:
+        try:
+            return Response(orjson.dumps(response), mimetype='application/json'), 200
+        except orjson.JSONEncodeError:
+            pass
+    return jsonify(response), 200
+
+# How long, in seconds, a finished mining job can still be polled
+MINING_JOB_TTL = 300
+
 # --- APP SETUP ---
-app = Flask(__name__)
+def create_app():
+    """
+    Creates the Flask app for a node, with its own blockchain and mining
+    worker, so nothing is set up just by importing this module.
 
-# Generate a globally unique address for this node
-node_identifier = str(uuid.uuid4()).replace('-', '')
+    :return: The configured Flask app.
+    """
+    app = Flask(__name__)
 
-# Instantiate the Blockchain
-blockchain = Blockchain()
+    # Generate a globally unique address for this node
+    node_identifier = secrets.token_hex(16)
 
-# --- API ENDPOINTS ---
+    # Instantiate the Blockchain
+    blockchain = Blockchain()
 
-@app.route('/')
-def index():
-    """Serves the user interface."""
-    return render_template('index.html')
+    # Mining runs in the background, one job at a time, so a long proof of work
+    # doesn't hold up other requests. Jobs are kept by id for polling until
+    # MINING_JOB_TTL seconds after they finish.
+    mining_executor = ThreadPoolExecutor(max_workers=1)
+    mining_jobs = {}
+    finished_at = {}
+    mining_lock = threading.Lock()
+    current_job_id = None
 
-@app.route('/mine', methods=['GET'])
-def mine():
-    """
-    Runs the proof of work algorithm to find the next proof, rewards the miner,
-    and adds the new block to the chain.
-    """
-    last_block = blockchain.get_last_block()
-    last_proof = last_block.proof
-    proof = blockchain.proof_of_work(last_proof)
-
-    # Reward the miner by adding a transaction. Sender "0" signifies a new coin.
-    blockchain.add_data(
-        data={"sender": "0", "recipient": node_identifier, "details": "Mining Reward"}
-    )
-
-    # Forge the new Block by adding it to the chain
-    previous_hash = last_block.hash
-    block = blockchain.create_block(blockchain.pending_data, previous_hash, proof)
-
-    response = {
-        'message': "New Block Forged",
-        'index': block.index,
-        'data': block.data,
-        'proof': block.proof,
-        'previous_hash': block.previous_hash,
-    }
-    return jsonify(response), 200
+    def forge_block():
+        """
+        Runs the proof of work algorithm to find the next proof, rewards the miner,
+        and adds the new block to the chain. Mining starts over if the chain is
+        replaced before the block can be added.
 
-@app.route('/transactions/new', methods=['POST'])
-def new_transaction():
-    """
-    Receives new medical record data as a POST request and adds it to the
-    list of pending data.
-    """
-    values = request.get_json(force=True)
-    if not values:
-        return "Error: Invalid or empty JSON provided", 400
-
-    # Check that the required fields are in the POST'd data
-    required = ['patient_id', 'details']
-    if not all(k in values for k in required):
-        return 'Missing required JSON values: patient_id, details', 400
-
-    # Add the new data to the pending list
-    index = blockchain.add_data(values)
-    response = {'message': f'Transaction will be added to Block {index}'}
-    return jsonify(response), 201
-
-@app.route('/chain', methods=['GET'])
-def full_chain():
-    """Returns the full, current blockchain as JSON."""
-    chain_data = []
-    for block in blockchain.chain:
-        # Convert our Block objects to dictionaries to be serializable
-        chain_data.append(block.__dict__)
-        
-    response = {
-        'chain': chain_data,
-        'length': len(blockchain.chain),
-    }
-    return jsonify(response), 200
+        :return: A description of the newly forged block.
+        """
+        while True:
+            last_block = blockchain.get_last_block()
+            last_proof = last_block.proof
+            proof = blockchain.proof_of_work(last_proof)
 
-@app.route('/nodes/register', methods=['POST'])
-def register_nodes():
-    """
-    Accepts a list of new nodes in the form of URLs and registers them.
-    """
-    values = request.get_json(force=True)
-    nodes = values.get('nodes')
-    if nodes is None:
-        return "Error: Please supply a valid list of nodes", 400
-
-    for node in nodes:
-        blockchain.register_node(node)
-
-    response = {
-        'message': 'New nodes have been added',
-        'total_nodes': list(blockchain.nodes),
-    }
-    return jsonify(response), 201
-
-@app.route('/nodes/resolve', methods=['GET'])
-def consensus():
-    """
-    Runs the consensus algorithm to resolve any conflicts and ensure the node
-    has the correct chain.
-    """
-    replaced = blockchain.resolve_conflicts()
+            # Reward the miner by adding a transaction. Sender "0" signifies a new coin.
+            records = blockchain.drain_pending_data()
+            reward = {"sender": "0", "recipient": node_identifier, "details": "Mining Reward"}
+
+            # Forge the new Block by adding it to the chain
+            previous_hash = last_block.hash
+            block = blockchain.create_block(records + [reward], previous_hash, proof)
+            if block is not None:
+                break
+
+            # The chain was replaced while mining, so the proof no longer
+            # extends it. Put the records back and mine on the new last block.
+            blockchain.restore_pending_data(records)
+
+        return {
+            'message': "New Block Forged",
+            'index': block.index,
+            'data': block.data,
+            'proof': block.proof,
+            'previous_hash': block.previous_hash,
+        }
+
+    def run_mining_job(job_id):
+        """
+        Forges a block as the given job and records when the job finished.
+        """
+        try:
+            return forge_block()
+        finally:
+            with mining_lock:
+                finished_at[job_id] = monotonic()
+
+    def prune_mining_jobs():
+        """
+        Forgets jobs that finished more than MINING_JOB_TTL seconds ago, so
+        jobs that are never polled don't pile up. Call with mining_lock held.
+        """
+        expired = monotonic() - MINING_JOB_TTL
+        for job_id, finished in list(finished_at.items()):
+            if finished < expired:
+                del finished_at[job_id]
+                mining_jobs.pop(job_id, None)
+
+    # --- API ENDPOINTS ---
+
+    @app.route('/')
+    def index():
+        """Serves the user interface."""
+        return render_template('index.html')
+
+    @app.route('/mine', methods=['GET'])
+    def mine():
+        """
+        Starts mining a new block in the background and returns the id of the
+        job, which can be polled at /mine/<job_id>. If a block is already
+        being mined, the id of that job is returned instead of queueing
+        another one.
+        """
+        nonlocal current_job_id
+        with mining_lock:
+            prune_mining_jobs()
+            job = mining_jobs.get(current_job_id)
+            if job is not None and not job.done():
+                response = {'message': 'Mining already in progress', 'job_id': current_job_id}
+                return jsonify(response), 202
+
+            job_id = secrets.token_hex(16)
+            mining_jobs[job_id] = mining_executor.submit(run_mining_job, job_id)
+            current_job_id = job_id
 
-    if replaced:
         response = {
-            'message': 'Our chain was replaced by the authoritative one.',
-            'new_chain': [block.__dict__ for block in blockchain.chain]
+            'message': 'Mining started',
+            'job_id': job_id,
         }
-    else:
+        return jsonify(response), 202
+
+    @app.route('/mine/<job_id>', methods=['GET'])
+    def mine_status(job_id):
+        """
+        Reports on a mining job, returning the forged block once it is done.
+        """
+        with mining_lock:
+            prune_mining_jobs()
+            job = mining_jobs.get(job_id)
+        if job is None:
+            return 'Error: Unknown mining job', 404
+
+        if not job.done():
+            response = {'message': 'Mining in progress', 'job_id': job_id}
+            return jsonify(response), 202
+
+        error = job.exception()
+        if error is not None:
+            return f'Error: Mining failed: {error}', 500
+        return jsonify(job.result()), 200
+
+    @app.route('/transactions/new', methods=['POST'])
+    def new_transaction():
+        """
+        Receives new medical record data as a POST request and adds it to the
+        list of pending data.
+        """
+        values = request.get_json(force=True)
+        if not values:
+            return "Error: Invalid or empty JSON provided", 400
+
+        # Check that the required fields are in the POST'd data
+        required = ['patient_id', 'details']
+        if not all(k in values for k in required):
+            return 'Missing required JSON values: patient_id, details', 400
+
+        # Add the new data to the pending list
+        index = blockchain.add_data(values)
+        response = {'message': f'Transaction will be added to Block {index}'}
+        return jsonify(response), 201
+
+    @app.route('/chain', methods=['GET'])
+    def full_chain():
+        """Returns the full, current blockchain as JSON."""
+        # Each block keeps a ready-made serializable dictionary
+        chain_data = [block.to_dict() for block in blockchain.chain]
+
         response = {
-            'message': 'Our chain is authoritative.',
-            'chain': [block.__dict__ for block in blockchain.chain]
+            'chain': chain_data,
+            'length': len(blockchain.chain),
         }
-    return jsonify(response), 200
+        return chain_response(response)
 
-@app.route('/nodes/get', methods=['GET'])
-def get_nodes():
-    """Returns the list of known nodes."""
-    nodes = list(blockchain.nodes)
-    response = {'nodes': nodes}
-    return jsonify(response), 200
+    @app.route('/chain/headers', methods=['GET'])
+    def chain_headers():
+        """
+        Returns the current blockchain without the blocks' data. The data can
+        be fetched separately from /blocks/data or /block/<index>/data.
+        """
+        response = {
+            'chain': [block.header_dict() for block in blockchain.chain],
+            'length': len(blockchain.chain),
+        }
+        return chain_response(response)
 
-# In api.py, add these two new endpoints
+    @app.route('/block/<int:index>/data', methods=['GET'])
+    def block_data(index):
+        """Returns the data stored in a single block."""
+        chain = blockchain.chain
+        if index >= len(chain):
+            return 'Error: No block at that index', 404
 
-@app.route('/difficulty', methods=['GET'])
-def get_difficulty():
-    """Returns the current mining difficulty."""
-    response = {'difficulty': blockchain.difficulty}
-    return jsonify(response), 200
+        response = {
+            'index': index,
+            'data': chain[index].data,
+        }
+        return jsonify(response), 200
+
+    @app.route('/blocks/data', methods=['GET'])
+    def blocks_data():
+        """
+        Returns the data of the blocks from index `from` up to, but not
+        including, index `to` (by default, the end of the chain), so a peer
+        can fetch all the data it is missing in one request.
+        """
+        chain = blockchain.chain
+        try:
+            start = int(request.args['from'])
+            stop = int(request.args.get('to', len(chain)))
+        except (KeyError, ValueError):
+            return 'Error: "from" and "to" must be block indices', 400
+
+        if start < 0 or stop < start:
+            return 'Error: Invalid block range', 400
+        if stop > len(chain):
+            return 'Error: No block at that index', 404
+
+        response = {
+            'from': start,
+            'data': [block.data for block in chain[start:stop]],
+        }
+        return chain_response(response)
+
+    @app.route('/chain/length', methods=['GET'])
+    def chain_length():
+        """
+        Returns only the length of the current blockchain, so peers can decide
+        whether the full chain is worth downloading.
+        """
+        response = {'length': len(blockchain.chain)}
+        return jsonify(response), 200
+
+    @app.route('/nodes/register', methods=['POST'])
+    def register_nodes():
+        """
+        Accepts a list of new nodes in the form of URLs and registers them.
+        """
+        values = request.get_json(force=True)
+        nodes = values.get('nodes')
+        if nodes is None:
+            return "Error: Please supply a valid list of nodes", 400
+
+        for node in nodes:
+            blockchain.register_node(node)
 
-@app.route('/difficulty', methods=['POST'])
-def set_difficulty():
-    """Sets a new mining difficulty."""
-    values = request.get_json(force=True)
-    if not values or 'difficulty' not in values:
-        return 'Error: Missing "difficulty" in request body', 400
-    
-    try:
-        new_difficulty = int(values['difficulty'])
-        if new_difficulty < 1:
-            return 'Difficulty must be a positive integer.', 400
-        
-        blockchain.difficulty = new_difficulty
         response = {
-            'message': f'Mining difficulty set to {new_difficulty}',
-            'difficulty': new_difficulty
+            'message': 'New nodes have been added',
+            'total_nodes': list(blockchain.nodes),
         }
+        return jsonify(response), 201
+
+    @app.route('/nodes/resolve', methods=['GET'])
+    def consensus():
+        """
+        Runs the consensus algorithm to resolve any conflicts and ensure the node
+        has the correct chain.
+        """
+        replaced = blockchain.resolve_conflicts()
+
+        if replaced:
+            response = {
+                'message': 'Our chain was replaced by the authoritative one.',
+                'new_chain': [block.to_dict() for block in blockchain.chain]
+            }
+        else:
+            response = {
+                'message': 'Our chain is authoritative.',
+                'chain': [block.to_dict() for block in blockchain.chain]
+            }
+        return chain_response(response)
+
+    @app.route('/nodes/get', methods=['GET'])
+    def get_nodes():
+        """Returns the list of known nodes."""
+        nodes = list(blockchain.nodes)
+        response = {'nodes': nodes}
+        return jsonify(response), 200
+
+    @app.route('/difficulty', methods=['GET'])
+    def get_difficulty():
+        """Returns the current mining difficulty."""
+        response = {'difficulty': blockchain.difficulty}
         return jsonify(response), 200
-    except (ValueError, TypeError):
-        return 'Invalid difficulty provided. Must be an integer.', 400
+
+    @app.route('/difficulty', methods=['POST'])
+    def set_difficulty():
+        """Sets a new mining difficulty."""
+        values = request.get_json(force=True)
+        if not values or 'difficulty' not in values:
+            return 'Error: Missing "difficulty" in request body', 400
+
+        try:
+            new_difficulty = int(values['difficulty'])
+            if new_difficulty < 1:
+                return 'Difficulty must be a positive integer.', 400
+
+            blockchain.difficulty = new_difficulty
+            response = {
+                'message': f'Mining difficulty set to {new_difficulty}',
+                'difficulty': new_difficulty
+            }
+            return jsonify(response), 200
+        except (ValueError, TypeError):
+            return 'Invalid difficulty provided. Must be an integer.', 400
+
+    return app
 
 # --- SERVER EXECUTION ---
 if __name__ == '__main__':
     # Get the port from the command-line arguments, default to 5000
     port = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
-    app.run(host='0.0.0.0', port=port)
\ No newline at end of file
+    app = create_app()
+    if serve is not None:
+        serve(app, host='0.0.0.0', port=port, threads=16)
+    else:
+        app.run(host='0.0.0.0', port=port, threaded=True)
\ No newline at end of file
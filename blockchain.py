@@ -1,13 +1,288 @@
+import atexit
 import hashlib
 import json
+import multiprocessing
+import os
+import struct
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from json.encoder import encode_basestring_ascii
 from time import time
 import requests
 
+# orjson is optional; when installed it parses peer chains much faster
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+# The Numba-compiled miner is optional; it needs numpy and numba installed
+try:
+    from pow_numba import search_range as numba_search_range
+except ImportError:
+    numba_search_range = None
+
+# A shared session so repeated requests to peers reuse pooled connections
+session = requests.Session()
+
+# Seconds to wait on a peer before giving up on it
+PEER_TIMEOUT = 2
+
+# Upper bound on the number of peers queried at the same time
+MAX_PEER_WORKERS = 32
+
+
+# Number of nonces scanned per batch by the proof-of-work search
+SEARCH_CHUNK = 1 << 14
+
+# Searches at or above this difficulty are split across worker processes;
+# below it, handing the work out costs more than the search itself
+PARALLEL_MIN_DIFFICULTY = 5
+
+# Seconds to wait for a newly started mining worker process to come up.
+# Spawned workers re-import the main module, so they can't start when it
+# isn't a file (e.g., code piped into python); multiprocessing.Pool would
+# keep restarting them, so mining falls back to a single process instead.
+MINING_POOL_START_TIMEOUT = 30
+
+
+def proof_target(difficulty):
+    """
+    Converts a difficulty into the threshold a valid proof's digest must sort
+    below. A hash has `difficulty` leading zero hex digits exactly when its
+    digest, read as a big-endian number, is below 16 ** (64 - difficulty), so
+    the raw digest can be compared without building its hex string.
+
+    :param difficulty: The number of leading zeros required.
+    :return: The threshold bytes to compare digests against.
+    """
+    if difficulty <= 0:
+        # Longer than any digest, so every digest sorts below it
+        return b'\xff' * 33
+    if difficulty > 64:
+        # No digest sorts below an empty threshold
+        return b''
+    return (1 << (256 - 4 * difficulty)).to_bytes(32, 'big')
+
+
+def search_range(prefix, difficulty, start, stop):
+    """
+    Scans proofs in [start, stop) for one whose hash with `prefix` has
+    `difficulty` leading zeros.
+
+    :param prefix: The encoded proof of the previous block.
+    :param difficulty: The number of leading zeros required.
+    :param start: The first proof to try.
+    :param stop: The proof to stop before.
+    :return: The first valid proof in the range, or None if there is none.
+    """
+    # Hash the constant prefix once and resume from a copy of that state
+    # for every proof, rather than rehashing prefix + proof from scratch
+    base_copy = hashlib.sha256(prefix).copy
+    target = proof_target(difficulty)
+
+    for proof in range(start, stop):
+        guess_hash = base_copy()
+        guess_hash.update(str(proof).encode())
+        if guess_hash.digest() < target:
+            return proof
+    return None
+
+
+def find_nonce(last_proof, difficulty, search=search_range):
+    """
+    Searches for the first proof that, hashed together with last_proof,
+    produces a hash with `difficulty` leading zeros.
+
+    The nonce space is scanned in batches of SEARCH_CHUNK so the hot loop
+    runs over a bounded range rather than a counter, and the constant
+    last_proof prefix is encoded and hashed once per batch. hashlib's
+    SHA-256 is backed by OpenSSL, which already uses SHA-NI or AVX2 where
+    the CPU supports it.
+
+    :param last_proof: The proof from the previous block.
+    :param difficulty: The number of leading zeros required.
+    :param search: The function used to scan each batch, with the same
+        signature as search_range.
+    :return: The new, valid proof number.
+    """
+    prefix = str(last_proof).encode()
+
+    start = 0
+    while True:
+        proof = search(prefix, difficulty, start, start + SEARCH_CHUNK)
+        if proof is not None:
+            return proof
+        start += SEARCH_CHUNK
+
+
+def available_cpus():
+    """
+    Returns the number of CPUs this process may run on. Unlike
+    os.cpu_count(), this respects CPU affinity, such as the CPUs a
+    container is pinned to, where the platform reports it.
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0)) or 1
+    return os.cpu_count() or 1
+
+
+# The flag a mining worker process checks to stop searching, shared by all
+# workers in a pool and set by _init_mining_worker
+_stop_flag = None
+
+
+def _init_mining_worker(stop_flag):
+    """
+    Stores the shared stop flag in a newly started mining worker process.
+    """
+    global _stop_flag
+    _stop_flag = stop_flag
+
+
+def _search_stripe(task):
+    """
+    Scans every `workers`-th batch of proofs, starting from batch `worker`,
+    until this or another worker finds a valid proof. The stop flag is only
+    checked between batches, so it costs nothing per nonce.
+
+    :param task: A (prefix, difficulty, worker, workers, search) tuple.
+    :return: A valid proof, or None if another worker found one first.
+    """
+    prefix, difficulty, worker, workers, search = task
+
+    start = worker * SEARCH_CHUNK
+    while not _stop_flag.value:
+        proof = search(prefix, difficulty, start, start + SEARCH_CHUNK)
+        if proof is not None:
+            _stop_flag.value = 1
+            return proof
+        start += workers * SEARCH_CHUNK
+    return None
+
+
+def check_proofs(proof_pairs, target):
+    """
+    Validates a batch of (last_proof, proof) pairs against a digest threshold.
+
+    :param proof_pairs: An iterable of (last_proof, proof) pairs.
+    :param target: The threshold from proof_target that each digest must
+        sort below.
+    :return: True if every pair is a valid proof of work, False otherwise.
+    """
+    sha256 = hashlib.sha256
+
+    for last_proof, proof in proof_pairs:
+        if sha256(f'{last_proof}{proof}'.encode()).digest() >= target:
+            return False
+    return True
+
+
+# Generated record encoders, keyed by the record's sorted keys
+_record_encoders = {}
+
+# Upper bound on the number of record layouts that get their own encoder
+MAX_RECORD_ENCODERS = 64
+
+# Layouts of medical records and mining rewards, which always have an
+# encoder however many other layouts clients send
+COMMON_RECORD_LAYOUTS = (('details', 'patient_id'), ('details', 'recipient', 'sender'))
+
+
+def _record_encoder(keys):
+    """
+    Generates a function that encodes records with exactly these keys, in
+    any order, and only string values. The sorted keys and separators are
+    fixed into the generated code, so it produces the same bytes as
+    json.dumps without re-sorting or walking the record generically.
+
+    :param keys: A non-empty tuple of the record's string keys.
+    :return: A function taking a record and returning its encoding. It
+        raises TypeError if one of the record's values isn't a string.
+    """
+    parts = []
+    for position, key in enumerate(sorted(keys)):
+        prefix = ('{' if position == 0 else ',') + encode_basestring_ascii(key) + ':'
+        parts.append(f'{prefix!r} + encode(record[{key!r}])')
+    source = 'lambda record: (' + ' + '.join(parts) + " + '}').encode()"
+    return eval(source, {'encode': encode_basestring_ascii})
+
+
+_record_encoders.update((keys, _record_encoder(keys)) for keys in COMMON_RECORD_LAYOUTS)
+
+
+def record_bytes(record):
+    """
+    Returns the compact, sorted JSON encoding of a single record. Records
+    made only of strings, such as medical records and mining rewards, go
+    through an encoder generated for their layout; anything else falls back
+    to json.dumps.
+    """
+    if type(record) is dict and record and all(type(key) is str for key in record):
+        # The encoding is sorted anyway, so records with the same keys in
+        # any order share an encoder
+        keys = tuple(sorted(record))
+        encoder = _record_encoders.get(keys)
+        if encoder is None and len(_record_encoders) < MAX_RECORD_ENCODERS:
+            encoder = _record_encoders[keys] = _record_encoder(keys)
+        if encoder is not None:
+            try:
+                return encoder(record)
+            except TypeError:
+                pass
+    return json.dumps(record, sort_keys=True, separators=(',', ':')).encode()
+
+
+def double_sha256(data):
+    """
+    Returns the SHA-256 digest of the SHA-256 digest of data.
+    """
+    return hashlib.sha256(hashlib.sha256(data).digest()).digest()
+
+
+def compute_merkle_root(data):
+    """
+    Computes the Merkle root of a block's data, with each record as a leaf.
+    Leaves and inner nodes are hashed with different one-byte prefixes so
+    one can't be passed off as the other, and the last node of an odd level
+    is carried up unchanged.
+
+    :param data: A list of records.
+    :return: The hex-encoded Merkle root.
+    :raises TypeError: If data is not a list, as the root would not then
+        commit to the shape of the data.
+    """
+    if type(data) is not list:
+        raise TypeError('Block data must be a list of records')
+    level = [double_sha256(b'\x00' + record_bytes(record)) for record in data]
+    if not level:
+        return double_sha256(b'').hex()
+
+    while len(level) > 1:
+        paired = [double_sha256(b'\x01' + level[i] + level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            paired.append(level[-1])
+        level = paired
+    return level[0].hex()
+
+
+# The fixed-size part of a block's canonical form: index, timestamp, proof
+# and the length of the previous hash that follows it
+BLOCK_HEADER = struct.Struct('>QdQH')
+
+# The fields of a block other than its data
+HEADER_FIELDS = ('index', 'timestamp', 'proof', 'previous_hash', 'merkle_root', 'hash')
+
+
 class Block:
     """
     Represents a single block in the blockchain.
     """
-    def __init__(self, index, timestamp, data, proof, previous_hash):
+    __slots__ = ('index', 'timestamp', 'data', 'proof', 'previous_hash', 'merkle_root', 'hash', '_dict', '_header')
+
+    def __init__(self, index, timestamp, data, proof, previous_hash, hash=None, merkle_root=None):
         """
         Constructs a new Block.
 
@@ -16,28 +291,108 @@ class Block:
         :param data: The data to be stored (e.g., medical records).
         :param proof: The proof of work number that resulted in this block.
         :param previous_hash: The hash of the previous block in the chain.
+        :param hash: The block's already-known hash. It is calculated when omitted.
+        :param merkle_root: The already-known Merkle root of the data. It is
+            calculated when omitted.
         """
         self.index = index
         self.timestamp = timestamp
         self.data = data
         self.proof = proof
         self.previous_hash = previous_hash
-        self.hash = self.calculate_hash()
+        self.merkle_root = merkle_root if merkle_root is not None else compute_merkle_root(data)
+        self.hash = hash if hash is not None else self.calculate_hash()
+        self._header = None
+        self._dict = {
+            "index": index,
+            "timestamp": timestamp,
+            "data": data,
+            "proof": proof,
+            "previous_hash": previous_hash,
+            "merkle_root": self.merkle_root,
+            "hash": self.hash
+        }
+
+    @classmethod
+    def from_dict(cls, block_data):
+        """
+        Rebuilds a Block from its dictionary form (e.g., a peer's /chain
+        response), reusing the hash and Merkle root it carries instead of
+        recalculating them.
+
+        :param block_data: A block dictionary as produced by to_dict().
+        :return: The reconstructed Block object.
+        """
+        return cls(
+            block_data['index'],
+            block_data['timestamp'],
+            block_data['data'],
+            block_data['proof'],
+            block_data['previous_hash'],
+            hash=block_data['hash'],
+            merkle_root=block_data['merkle_root']
+        )
+
+    def to_dict(self):
+        """
+        Returns the block as a serializable dictionary. The dictionary is
+        built once at construction and must not be modified.
+        """
+        return self._dict
+
+    def header_dict(self):
+        """
+        Returns the block without its data as a serializable dictionary.
+        It is built on first use and must not be modified.
+        """
+        if self._header is None:
+            self._header = {field: self._dict[field] for field in HEADER_FIELDS}
+        return self._header
+
+    @staticmethod
+    def header_bytes(index, timestamp, proof, previous_hash, merkle_root):
+        """
+        Returns the encoding of a block that its hash covers: the packed
+        fixed-size fields, then the previous hash and the raw Merkle root.
+        """
+        previous_hash = previous_hash.encode()
+        return b''.join((
+            BLOCK_HEADER.pack(index, timestamp, proof, len(previous_hash)),
+            previous_hash,
+            bytes.fromhex(merkle_root)
+        ))
+
+    @staticmethod
+    def header_hash(header):
+        """
+        Calculates the hash a block header should carry.
+
+        :param header: A block dictionary, with or without its data.
+        :return: The hex-encoded SHA-256 hash.
+        """
+        return hashlib.sha256(Block.header_bytes(
+            header['index'],
+            header['timestamp'],
+            header['proof'],
+            header['previous_hash'],
+            header['merkle_root']
+        )).hexdigest()
 
     def calculate_hash(self):
         """
         Calculates the SHA-256 hash of the block.
-        The block's dictionary is converted to a sorted JSON string to ensure
-        consistent hashes.
-        """
-        block_string = json.dumps({
-            "index": self.index,
-            "timestamp": self.timestamp,
-            "data": self.data,
-            "proof": self.proof,
-            "previous_hash": self.previous_hash
-        }, sort_keys=True).encode()
-        return hashlib.sha256(block_string).hexdigest()
+        The data is covered through its Merkle root, so the hash can be
+        checked from the block's header alone.
+        """
+        # Hashed exactly the way a peer's header is checked
+        return Block.header_hash({
+            'index': self.index,
+            'timestamp': self.timestamp,
+            'proof': self.proof,
+            'previous_hash': self.previous_hash,
+            'merkle_root': self.merkle_root,
+        })
+
 
 class Blockchain:
     """
@@ -50,12 +405,24 @@ class Blockchain:
         and node set, and creates the genesis block.
         """
         self.chain = []
-        self.pending_data = []
+        # Maps each block hash in our chain to that block's position
+        self._hash_index = {}
+        # The index the next block will get, so add_data can report it
+        self._next_index = 0
+        self.pending_data = deque()
+        # Guards pending_data and the chain against concurrent API requests
+        self._lock = threading.Lock()
         self.nodes = set()
         self.difficulty = 4
+        # Mine with the compiled search when it is available
+        self._search_range = numba_search_range or search_range
+        # Hard searches are split across this many processes, started on first use
+        self.mining_workers = available_cpus()
+        self._mining_pool = None
+        self._stop_flag = None
         # Create the very first block in the chain
         print("Creating genesis block...")
-        self.create_block(previous_hash="0", data={"patient_id": "Genesis", "details": "First Block"}, proof=100)
+        self.create_block(previous_hash="0", data=[{"patient_id": "Genesis", "details": "First Block"}], proof=100)
 
     def create_block(self, data, previous_hash, proof):
         """
@@ -64,18 +431,23 @@ class Blockchain:
         :param data: The data to be included in the new block.
         :param previous_hash: The hash of the block before this one.
         :param proof: The proof of work for this new block.
-        :return: The newly created Block object.
-        """
-        block = Block(
-            index=len(self.chain),
-            timestamp=time(),
-            data=data,
-            proof=proof,
-            previous_hash=previous_hash
-        )
-        # Reset the list of pending data now that it's been added to a block
-        self.pending_data = []
-        self.chain.append(block)
+        :return: The newly created Block object, or None if previous_hash is
+            no longer the hash of the last block (e.g., the chain was replaced
+            while the proof was being mined).
+        """
+        with self._lock:
+            if self.chain and previous_hash != self.chain[-1].hash:
+                return None
+            block = Block(
+                index=len(self.chain),
+                timestamp=time(),
+                data=data,
+                proof=proof,
+                previous_hash=previous_hash
+            )
+            self.chain.append(block)
+            self._hash_index[block.hash] = block.index
+            self._next_index = block.index + 1
         return block
 
     def add_data(self, data):
@@ -85,8 +457,46 @@ class Blockchain:
         :param data: The data to add (e.g., a new medical record).
         :return: The index of the block that will hold this data.
         """
-        self.pending_data.append(data)
-        return self.get_last_block().index + 1
+        with self._lock:
+            self.pending_data.append(data)
+            return self._next_index
+
+    def drain_pending_data(self):
+        """
+        Takes all of the pending data, leaving the pending queue empty.
+
+        :return: A list of the pending data, in the order it was added.
+        """
+        with self._lock:
+            data = list(self.pending_data)
+            self.pending_data.clear()
+        return data
+
+    def restore_pending_data(self, data):
+        """
+        Puts data taken by drain_pending_data back at the front of the
+        pending queue, ahead of anything added since.
+
+        :param data: A list of data, in the order it was originally added.
+        """
+        with self._lock:
+            self.pending_data.extendleft(reversed(data))
+
+    @property
+    def difficulty(self):
+        """
+        The number of leading zeros a proof's hash must have.
+        """
+        return self._difficulty
+
+    @difficulty.setter
+    def difficulty(self, difficulty):
+        """
+        Sets the difficulty and precomputes the digest threshold that proofs
+        are checked against, so it isn't rebuilt on every check.
+        """
+        self._difficulty = difficulty
+        self._target = proof_target(difficulty)
 
     def get_last_block(self):
         """
@@ -99,28 +509,91 @@ class Blockchain:
         """
         Validates a proof of work against the current difficulty.
         """
-        # Create the target string of zeros based on the current difficulty
-        target = '0' * self.difficulty
-
-        guess = f'{last_proof}{proof}'.encode()
-        guess_hash = hashlib.sha256(guess).hexdigest()
-
-        # Check if the hash starts with the required number of zeros
-        return guess_hash[:self.difficulty] == target
+        return check_proofs([(last_proof, proof)], self._target)
 
     def proof_of_work(self, last_proof):
         """
         Finds a number 'proof' that, when hashed with the previous proof,
-        produces a hash with 4 leading zeros.
+        produces a hash with the current difficulty's leading zeros.
 
         :param last_proof: The proof from the previous block.
         :return: The new, valid proof number.
         """
-        proof = 0
-        while not self.is_valid_proof(last_proof, proof):
-            proof += 1
+        if self.mining_workers > 1 and self.difficulty >= PARALLEL_MIN_DIFFICULTY:
+            return self.parallel_proof_of_work(last_proof)
+        return find_nonce(last_proof, self.difficulty, self._search_range)
+
+    def parallel_proof_of_work(self, last_proof):
+        """
+        Finds a valid proof by splitting the search into disjoint stripes of
+        batches, one per worker process. The first worker to find a proof
+        sets a shared flag that stops the others, so the proof returned is
+        valid but not necessarily the smallest one.
+
+        :param last_proof: The proof from the previous block.
+        :return: The new, valid proof number.
+        :raises RuntimeError: If mining was stopped by close() before a proof
+            was found.
+        """
+        if self._mining_pool is None:
+            # Spawned rather than forked, as the API mines from a worker thread
+            context = multiprocessing.get_context('spawn')
+            self._stop_flag = context.Value('b', 0)
+            self._mining_pool = context.Pool(
+                self.mining_workers,
+                initializer=_init_mining_worker,
+                initargs=(self._stop_flag,)
+            )
+            atexit.register(self.close)
+
+            try:
+                self._mining_pool.apply_async(os.getpid).get(MINING_POOL_START_TIMEOUT)
+            except multiprocessing.TimeoutError:
+                print("Mining worker processes failed to start; mining in a single process.")
+                self._mining_pool.terminate()
+                self._mining_pool = None
+                atexit.unregister(self.close)
+                self.mining_workers = 1
+                return find_nonce(last_proof, self.difficulty, self._search_range)
+
+        pool = self._mining_pool
+        self._stop_flag.value = 0
+        prefix = str(last_proof).encode()
+        tasks = [
+            (prefix, self.difficulty, worker, self.mining_workers, self._search_range)
+            for worker in range(self.mining_workers)
+        ]
+
+        # Wait for every worker to stop, so none is still searching when the
+        # flag is reset for the next block
+        proof = None
+        try:
+            for result in pool.imap_unordered(_search_stripe, tasks):
+                if proof is None:
+                    proof = result
+        except ValueError:
+            # close() shut the pool down before the search started
+            pass
+        if proof is None:
+            raise RuntimeError('Mining was stopped before a proof was found')
         return proof
 
+    def close(self):
+        """
+        Stops the mining worker processes, if any were started. A search in
+        progress ends at its next batch and parallel_proof_of_work raises
+        RuntimeError. The pool is started again if another hard proof of work
+        is needed.
+        """
+        pool = self._mining_pool
+        if pool is None:
+            return
+        self._mining_pool = None
+        self._stop_flag.value = 1
+        pool.close()
+        pool.join()
+        atexit.unregister(self.close)
+
     def register_node(self, address):
         """
         Adds a new node's address to the list of nodes.
@@ -129,30 +602,63 @@ class Blockchain:
         """
         self.nodes.add(address)
 
+    def shared_prefix_length(self, chain):
+        """
+        Finds how many leading blocks of a given chain are already part of
+        our own chain, by looking for the last of its blocks whose hash sits
+        at the same position in ours.
+
+        :param chain: A list of block dictionaries.
+        :return: The number of leading blocks shared with our chain.
+        """
+        for position in range(len(chain) - 1, -1, -1):
+            if self._hash_index.get(chain[position]['hash']) == position:
+                return position + 1
+        return 0
+
     def valid_chain(self, chain):
         """
         Determines if a given blockchain is valid by checking hashes and proofs.
+        Only block headers are needed, since the data is covered by each
+        block's Merkle root. Blocks it shares with our own chain are trusted,
+        so only the blocks after the fork point (and their link to it) are
+        checked.
 
-        :param chain: A list of block dictionaries.
+        :param chain: A list of block dictionaries, with or without their data.
         :return: True if the chain is valid, False otherwise.
         """
-        last_block = chain[0]
-        current_index = 1
+        shared = self.shared_prefix_length(chain)
+        start = max(shared - 1, 0)
 
-        while current_index < len(chain):
-            block = chain[current_index]
-            
-            # Check if the previous_hash link is correct
-            if block['previous_hash'] != last_block['hash']:
-                return False
+        # The last shared block is taken from our own chain rather than the
+        # peer's copy, which only matched it by hash
+        if shared:
+            blocks = [self.chain[start].header_dict()] + chain[start + 1:]
+        else:
+            blocks = chain
+
+        try:
+            # Pull the fields being checked into their own lists, so each check
+            # below is a single pass over one column
+            hashes = [block['hash'] for block in blocks]
+            previous_hashes = [block['previous_hash'] for block in blocks]
+            proofs = [block['proof'] for block in blocks]
 
-            # Check if the proof of work is valid
-            if not self.is_valid_proof(last_block['proof'], block['proof']):
+            # Check every previous_hash link first; comparing the two columns is
+            # one list comparison
+            if previous_hashes[1:] != hashes[:-1]:
                 return False
 
-            last_block = block
-            current_index += 1
-        return True
+            # Check that each block header hashes to the hash it carries, apart
+            # from the last shared block, which is our own
+            for block in blocks[1 if shared else 0:]:
+                if Block.header_hash(block) != block['hash']:
+                    return False
+
+            # Then check all of the proofs of work in one batch
+            return check_proofs(zip(proofs, proofs[1:]), self._target)
+        except (KeyError, TypeError, ValueError, AttributeError, struct.error):
+            return False
 
     def resolve_conflicts(self):
         """
@@ -161,29 +667,97 @@ class Blockchain:
 
         :return: True if our chain was replaced, False otherwise.
         """
-        neighbours = self.nodes
-        new_chain = None
+        neighbours = list(self.nodes)
         max_length = len(self.chain)
 
-        # Grab and verify the chains from all other nodes in the network
-        for node_address in neighbours:
+        if not neighbours:
+            return False
+
+        # Ask all other nodes in the network for just their chain length,
+        # concurrently, and keep the ones that claim a longer chain than ours
+        candidates = []
+        with ThreadPoolExecutor(max_workers=min(MAX_PEER_WORKERS, len(neighbours))) as executor:
+            futures = {
+                executor.submit(session.get, f'http://{node_address}/chain/length', timeout=PEER_TIMEOUT): node_address
+                for node_address in neighbours
+            }
+            for future in as_completed(futures):
+                node_address = futures[future]
+                try:
+                    response = future.result()
+                    if response.status_code == 200:
+                        length = response.json()['length']
+                        if length > max_length:
+                            candidates.append((length, node_address))
+                except requests.exceptions.RequestException as e:
+                    print(f"Could not connect to node {node_address}: {e}")
+                except (ValueError, KeyError, TypeError) as e:
+                    print(f"Invalid response from node {node_address}: {e}")
+
+        # Download chain headers only from those nodes, longest first, and stop
+        # at the first one that is actually longer and valid
+        for length, node_address in sorted(candidates, reverse=True):
             try:
-                response = requests.get(f'http://{node_address}/chain')
+                response = session.get(f'http://{node_address}/chain/headers', timeout=PEER_TIMEOUT)
                 if response.status_code == 200:
-                    length = response.json()['length']
-                    chain_data = response.json()['chain']
+                    headers = json_loads(response.content)['chain']
 
-                    # Check if the neighbor's chain is longer and valid
-                    if length > max_length and self.valid_chain(chain_data):
-                        max_length = length
-                        new_chain = chain_data
+                    if len(headers) > max_length and self.valid_chain(headers):
+                        # Keep our own Block objects for the shared prefix and fetch
+                        # the data for the rest, keeping the hashes the peer sent
+                        shared = self.shared_prefix_length(headers)
+                        new_blocks = self.fetch_block_data(node_address, headers, shared)
+                        if new_blocks is None:
+                            continue
+
+                        new_tail = [Block.from_dict(b) for b in new_blocks]
+                        with self._lock:
+                            # A block may have been mined onto our chain while the
+                            # data was downloading. Only swap if the peer's chain
+                            # is still longer and still forks from the same block.
+                            if len(headers) <= len(self.chain):
+                                continue
+                            if shared and self.chain[shared - 1].hash != headers[shared - 1]['hash']:
+                                continue
+                            new_chain = self.chain[:shared] + new_tail
+                            self.chain = new_chain
+                            self._hash_index = {block.hash: position for position, block in enumerate(new_chain)}
+                            self._next_index = len(new_chain)
+                        return True
             except requests.exceptions.RequestException as e:
                 print(f"Could not connect to node {node_address}: {e}")
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"Invalid response from node {node_address}: {e}")
+
+        return False
 
-        # If we found a longer, valid chain, replace ours
-        if new_chain:
-            # Reconstruct the chain using Block objects from the dictionary data
-            self.chain = [Block(b['index'], b['timestamp'], b['data'], b['proof'], b['previous_hash']) for b in new_chain]
-            return True
+    def fetch_block_data(self, node_address, headers, start):
+        """
+        Downloads the data of a node's blocks from a given position onwards,
+        in a single request, and checks it against each block's Merkle root.
+
+        :param node_address: The address of the node (e.g., '127.0.0.1:5001').
+        :param headers: The node's chain of block headers.
+        :param start: The position of the first block to fetch data for.
+        :return: A list of complete block dictionaries, or None if any
+            block's data is missing, malformed or doesn't match its Merkle root.
+        """
+        response = session.get(
+            f'http://{node_address}/blocks/data?from={start}&to={len(headers)}',
+            timeout=PEER_TIMEOUT
+        )
+        if response.status_code != 200:
+            return None
 
-        return False
\ No newline at end of file
+        blocks = []
+        try:
+            data_lists = json_loads(response.content)['data']
+            if type(data_lists) is not list or len(data_lists) != len(headers) - start:
+                return None
+            for header, data in zip(headers[start:], data_lists):
+                if compute_merkle_root(data) != header['merkle_root']:
+                    return None
+                blocks.append(dict(header, data=data))
+        except (ValueError, KeyError, TypeError):
+            return None
+        return blocks
\ No newline at end of file
@@ -0,0 +1,172 @@
+import numpy as np
+from numba import njit
+
+# SHA-256 round constants
+_K = np.array([
+    0x428a2f98, 0x71374491, 0xb5c0fbcf, 0xe9b5dba5, 0x3956c25b, 0x59f111f1, 0x923f82a4, 0xab1c5ed5,
+    0xd807aa98, 0x12835b01, 0x243185be, 0x550c7dc3, 0x72be5d74, 0x80deb1fe, 0x9bdc06a7, 0xc19bf174,
+    0xe49b69c1, 0xefbe4786, 0x0fc19dc6, 0x240ca1cc, 0x2de92c6f, 0x4a7484aa, 0x5cb0a9dc, 0x76f988da,
+    0x983e5152, 0xa831c66d, 0xb00327c8, 0xbf597fc7, 0xc6e00bf3, 0xd5a79147, 0x06ca6351, 0x14292967,
+    0x27b70a85, 0x2e1b2138, 0x4d2c6dfc, 0x53380d13, 0x650a7354, 0x766a0abb, 0x81c2c92e, 0x92722c85,
+    0xa2bfe8a1, 0xa81a664b, 0xc24b8b70, 0xc76c51a3, 0xd192e819, 0xd6990624, 0xf40e3585, 0x106aa070,
+    0x19a4c116, 0x1e376c08, 0x2748774c, 0x34b0bcb5, 0x391c0cb3, 0x4ed8aa4a, 0x5b9cca4f, 0x682e6ff3,
+    0x748f82ee, 0x78a5636f, 0x84c87814, 0x8cc70208, 0x90befffa, 0xa4506ceb, 0xbef9a3f7, 0xc67178f2,
+], dtype=np.uint32)
+
+# SHA-256 initial hash values
+_H0 = np.array([
+    0x6a09e667, 0xbb67ae85, 0x3c6ef372, 0xa54ff53a,
+    0x510e527f, 0x9b05688c, 0x1f83d9ab, 0x5be0cd19,
+], dtype=np.uint32)
+
+# Enough room for the decimal digits of any 64-bit proof
+_MAX_DIGITS = 20
+
+
+@njit(cache=True, inline='always')
+def _rotr(x, n):
+    """
+    Rotates a 32-bit word right by n bits.
+    """
+    return np.uint32((x >> np.uint32(n)) | (x << np.uint32(32 - n)))
+
+
+@njit(cache=True, boundscheck=False)
+def _sha256(buf, n_blocks, state, w):
+    """
+    Hashes the first n_blocks 64-byte blocks of an already padded message
+    into state. Numba widens uint32 arithmetic, so sums are cast back to
+    32 bits where they wrap.
+
+    :param buf: The padded message as a uint8 array.
+    :param n_blocks: The number of 64-byte blocks to compress.
+    :param state: A uint32 array of length 8 that receives the digest words.
+    :param w: A uint32 scratch array of length 64 for the message schedule.
+    """
+    for i in range(8):
+        state[i] = _H0[i]
+
+    for block in range(n_blocks):
+        offset = block * 64
+        for t in range(16):
+            i = offset + 4 * t
+            w[t] = (np.uint32(buf[i]) << np.uint32(24)) | (np.uint32(buf[i + 1]) << np.uint32(16)) | (np.uint32(buf[i + 2]) << np.uint32(8)) | np.uint32(buf[i + 3])
+        for t in range(16, 64):
+            x = w[t - 15]
+            y = w[t - 2]
+            s0 = _rotr(x, 7) ^ _rotr(x, 18) ^ (x >> np.uint32(3))
+            s1 = _rotr(y, 17) ^ _rotr(y, 19) ^ (y >> np.uint32(10))
+            w[t] = w[t - 16] + s0 + w[t - 7] + s1
+
+        a = state[0]
+        b = state[1]
+        c = state[2]
+        d = state[3]
+        e = state[4]
+        f = state[5]
+        g = state[6]
+        h = state[7]
+        for t in range(64):
+            s1 = _rotr(e, 6) ^ _rotr(e, 11) ^ _rotr(e, 25)
+            ch = (e & f) ^ (~e & g)
+            t1 = np.uint32(h + s1 + ch + _K[t] + w[t])
+            s0 = _rotr(a, 2) ^ _rotr(a, 13) ^ _rotr(a, 22)
+            maj = (a & b) ^ (a & c) ^ (b & c)
+            t2 = np.uint32(s0 + maj)
+            h = g
+            g = f
+            f = e
+            e = np.uint32(d + t1)
+            d = c
+            c = b
+            b = a
+            a = np.uint32(t1 + t2)
+
+        state[0] += a
+        state[1] += b
+        state[2] += c
+        state[3] += d
+        state[4] += e
+        state[5] += f
+        state[6] += g
+        state[7] += h
+
+
+@njit(cache=True, boundscheck=False, nogil=True)
+def _search(prefix, difficulty, start, stop):
+    """
+    Scans proofs in [start, stop) for one whose hash with prefix has
+    difficulty leading zero hex digits, for 1 <= difficulty <= 64. It runs
+    without the GIL, so the API keeps serving requests while a block is mined.
+
+    :return: The first valid proof in the range, or -1 if there is none.
+    """
+    prefix_length = prefix.shape[0]
+    buf = np.zeros(((prefix_length + _MAX_DIGITS + 9 + 63) // 64) * 64, np.uint8)
+    buf[:prefix_length] = prefix
+    digits = np.empty(_MAX_DIGITS, np.uint8)
+    state = np.empty(8, np.uint32)
+    w = np.empty(64, np.uint32)
+
+    # The hash has `difficulty` leading zero hex digits when its first
+    # zero_words words are zero and the top nibbles of the next one are too
+    zero_words = difficulty // 8
+    shift = 32 - 4 * (difficulty % 8)
+
+    for proof in range(start, stop):
+        # Write the proof's decimal digits after the prefix
+        n = proof
+        n_digits = 0
+        while True:
+            digits[n_digits] = 48 + n % 10
+            n //= 10
+            n_digits += 1
+            if n == 0:
+                break
+        for i in range(n_digits):
+            buf[prefix_length + i] = digits[n_digits - 1 - i]
+        length = prefix_length + n_digits
+
+        # Pad the message and append its length in bits
+        n_blocks = (length + 9 + 63) // 64
+        end = n_blocks * 64
+        buf[length] = 0x80
+        for i in range(length + 1, end - 8):
+            buf[i] = 0
+        bits = length * 8
+        for i in range(8):
+            buf[end - 1 - i] = (bits >> (8 * i)) & 0xFF
+
+        _sha256(buf, n_blocks, state, w)
+
+        valid = True
+        for i in range(zero_words):
+            if state[i] != 0:
+                valid = False
+                break
+        if valid and shift < 32 and (state[zero_words] >> np.uint32(shift)) != 0:
+            valid = False
+        if valid:
+            return proof
+    return -1
+
+
+def search_range(prefix, difficulty, start, stop):
+    """
+    Scans proofs in [start, stop) for one whose hash with `prefix` has
+    `difficulty` leading zeros, using a Numba-compiled SHA-256. It is a
+    drop-in replacement for blockchain.search_range.
+
+    :param prefix: The encoded proof of the previous block.
+    :param difficulty: The number of leading zeros required.
+    :param start: The first proof to try.
+    :param stop: The proof to stop before.
+    :return: The first valid proof in the range, or None if there is none.
+    """
+    if start >= stop or difficulty > 64:
+        return None
+    if difficulty <= 0:
+        return start
+
+    proof = _search(np.frombuffer(prefix, dtype=np.uint8), difficulty, start, stop)
+    return proof if proof >= 0 else None
@@ -0,0 +1,76 @@
+import os
+import sys
+import time
+
+import pytest
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api
+import blockchain
+
+
+class PeerResponse:
+    """
+    Stands in for a requests.Response, built from a Flask test client
+    response or from a canned body.
+    """
+    def __init__(self, status_code, content):
+        self.status_code = status_code
+        self.content = content
+
+    def json(self):
+        return blockchain.json.loads(self.content)
+
+
+class Network:
+    """
+    Routes the blockchain module's peer requests to Flask test clients,
+    keyed by node address, with optional per-path overrides so tests can
+    make a peer misbehave.
+    """
+    def __init__(self):
+        self.clients = {}
+        self.overrides = {}
+        self.requests = []
+
+    def add_node(self, address, difficulty=2):
+        client = api.create_app().test_client()
+        client.post('/difficulty', json={'difficulty': difficulty})
+        self.clients[address] = client
+        return client
+
+    def get(self, url, timeout=None):
+        address, path = url[len('http://'):].split('/', 1)
+        path = '/' + path
+        self.requests.append((address, path))
+
+        if (address, path) in self.overrides:
+            status_code, content = self.overrides[(address, path)]
+            return PeerResponse(status_code, content)
+        if address not in self.clients:
+            raise requests.exceptions.ConnectionError(f'No node at {address}')
+
+        response = self.clients[address].get(path)
+        return PeerResponse(response.status_code, response.data)
+
+
+@pytest.fixture
+def network(monkeypatch):
+    network = Network()
+    monkeypatch.setattr(blockchain.session, 'get', network.get)
+    return network
+
+
+def mine(client):
+    """
+    Starts a mining job on a node and waits for the forged block.
+    """
+    job_id = client.get('/mine').get_json()['job_id']
+    while True:
+        response = client.get(f'/mine/{job_id}')
+        if response.status_code != 202:
+            assert response.status_code == 200
+            return response.get_json()
+        time.sleep(0.01)
@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import pytest
+
+import blockchain
+from blockchain import Blockchain, compute_merkle_root, proof_target, record_bytes
+
+
+@pytest.fixture
+def chain():
+    blockchain = Blockchain()
+    blockchain.difficulty = 2
+    return blockchain
+
+
+@pytest.mark.parametrize('record', [
+    {'patient_id': 'P1', 'details': 'Checkup'},
+    {'details': 'Checkup', 'patient_id': 'P1'},
+    {'sender': '0', 'recipient': 'abc', 'details': 'Mining Reward'},
+    {'patient_id': 'Pé', 'details': 'line\nbreak "quoted"'},
+    {'patient_id': 'P1', 'details': 'Checkup', 'age': 42},
+    {'nested': {'b': 1, 'a': [1, 2]}},
+    {},
+    'not a dict',
+])
+def test_record_bytes_matches_json_dumps(record):
+    assert record_bytes(record) == json.dumps(record, sort_keys=True, separators=(',', ':')).encode()
+
+
+def test_merkle_root_commits_to_data_shape():
+    record = {'patient_id': 'P1', 'details': 'Checkup'}
+    with pytest.raises(TypeError):
+        compute_merkle_root(record)
+    assert compute_merkle_root([record]) != compute_merkle_root([record, record])
+    assert compute_merkle_root([record, {}]) != compute_merkle_root([{}, record])
+
+
+def test_proof_target_matches_hex_prefix():
+    for proof in range(2000):
+        digest = hashlib.sha256(f'100{proof}'.encode())
+        assert (digest.digest() < proof_target(2)) == digest.hexdigest().startswith('00')
+
+
+def test_stale_block_is_not_appended(chain):
+    last_block = chain.get_last_block()
+    proof = chain.proof_of_work(last_block.proof)
+    assert chain.create_block([], last_block.hash, proof) is not None
+
+    # Mined on top of a block that is no longer the last one
+    assert chain.create_block([], last_block.hash, proof) is None
+    assert len(chain.chain) == 2
+    assert chain.valid_chain([block.header_dict() for block in chain.chain])
+
+
+def test_restored_data_keeps_its_place(chain):
+    chain.add_data({'patient_id': 'P1', 'details': 'a'})
+    chain.add_data({'patient_id': 'P2', 'details': 'b'})
+    taken = chain.drain_pending_data()
+    chain.add_data({'patient_id': 'P3', 'details': 'c'})
+    chain.restore_pending_data(taken)
+    assert [record['patient_id'] for record in chain.pending_data] == ['P1', 'P2', 'P3']
+
+
+def test_common_records_keep_their_encoder(monkeypatch):
+    monkeypatch.setattr(blockchain, '_record_encoders', dict(blockchain._record_encoders))
+    for i in range(2 * blockchain.MAX_RECORD_ENCODERS):
+        record_bytes({f'key{i}': 'value'})
+    assert len(blockchain._record_encoders) == blockchain.MAX_RECORD_ENCODERS
+
+    record_bytes({'patient_id': 'P1', 'details': 'Checkup'})
+    record_bytes({'sender': '0', 'recipient': 'abc', 'details': 'Mining Reward'})
+    assert len(blockchain._record_encoders) == blockchain.MAX_RECORD_ENCODERS
+    for keys in blockchain.COMMON_RECORD_LAYOUTS:
+        assert keys in blockchain._record_encoders
+
+
+def test_mining_pool_is_closed(monkeypatch, chain):
+    monkeypatch.setattr(blockchain, 'PARALLEL_MIN_DIFFICULTY', 2)
+    chain.mining_workers = 2
+    proof = chain.proof_of_work(100)
+    assert chain.is_valid_proof(100, proof)
+    assert chain._mining_pool is not None
+
+    chain.close()
+    assert chain._mining_pool is None
+    chain.close()
+
+
+def test_closing_the_pool_stops_mining(monkeypatch, chain):
+    monkeypatch.setattr(blockchain, 'PARALLEL_MIN_DIFFICULTY', 2)
+    chain.mining_workers = 2
+    chain.proof_of_work(100)
+
+    # No proof will be found at this difficulty, so only close() ends it
+    chain.difficulty = 64
+    errors = []
+
+    def mine():
+        try:
+            chain.proof_of_work(100)
+        except RuntimeError as error:
+            errors.append(error)
+
+    miner = threading.Thread(target=mine)
+    miner.start()
+    time.sleep(0.2)
+    chain.close()
+    miner.join(10)
+    assert not miner.is_alive()
+    assert len(errors) == 1
+
+
+def test_mining_falls_back_when_workers_cant_start(monkeypatch, chain):
+    # Workers look the initializer up by name, so this one fails in each of them
+    monkeypatch.setattr(blockchain, '_init_mining_worker', os._exit)
+    monkeypatch.setattr(blockchain, 'MINING_POOL_START_TIMEOUT', 1)
+    monkeypatch.setattr(blockchain, 'PARALLEL_MIN_DIFFICULTY', 2)
+    chain.mining_workers = 2
+
+    proof = chain.proof_of_work(100)
+    assert chain.is_valid_proof(100, proof)
+    assert chain.mining_workers == 1
+    assert chain._mining_pool is None
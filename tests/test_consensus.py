@@ -0,0 +1,222 @@
+import json
+import threading
+
+import blockchain
+from blockchain import Block, check_proofs, proof_target, search_range
+from conftest import mine
+
+
+def chain_of(client):
+    return client.get('/chain').get_json()['chain']
+
+
+def register(client, *addresses):
+    client.post('/nodes/register', json={'nodes': list(addresses)})
+
+
+def resolve(client):
+    response = client.get('/nodes/resolve')
+    assert response.status_code == 200
+    return response.get_json()['message']
+
+
+def test_two_nodes_sync(network):
+    node_a = network.add_node('a:1')
+    node_b = network.add_node('b:2')
+
+    node_b.post('/transactions/new', json={'patient_id': 'P1', 'details': 'Checkup'})
+    mine(node_b)
+    mine(node_b)
+
+    register(node_a, 'b:2')
+    assert resolve(node_a) == 'Our chain was replaced by the authoritative one.'
+    assert chain_of(node_a) == chain_of(node_b)
+    assert chain_of(node_a)[1]['data'][0] == {'patient_id': 'P1', 'details': 'Checkup'}
+
+    mine(node_a)
+    register(node_b, 'a:1')
+    assert resolve(node_b) == 'Our chain was replaced by the authoritative one.'
+    assert chain_of(node_a) == chain_of(node_b)
+
+
+def test_only_blocks_after_the_fork_are_fetched(network):
+    node_a = network.add_node('a:1')
+    node_b = network.add_node('b:2')
+    mine(node_b)
+    register(node_a, 'b:2')
+    resolve(node_a)
+
+    mine(node_b)
+    network.requests.clear()
+    resolve(node_a)
+
+    assert ('b:2', '/chain') not in network.requests
+    assert [path for _, path in network.requests if '/data' in path] == ['/blocks/data?from=2&to=3']
+
+
+def test_first_sync_fetches_data_in_one_request(network):
+    node_a = network.add_node('a:1')
+    node_b = network.add_node('b:2')
+    for _ in range(3):
+        mine(node_b)
+
+    # Every node mines its own genesis block, so nothing is shared yet
+    register(node_a, 'b:2')
+    assert resolve(node_a) == 'Our chain was replaced by the authoritative one.'
+    assert [path for _, path in network.requests if '/data' in path] == ['/blocks/data?from=0&to=4']
+
+
+def test_shorter_chains_are_not_downloaded(network):
+    node_a = network.add_node('a:1')
+    network.add_node('b:2')
+    mine(node_a)
+
+    register(node_a, 'b:2')
+    assert resolve(node_a) == 'Our chain is authoritative.'
+    assert network.requests == [('b:2', '/chain/length')]
+
+
+def test_unreachable_node_is_skipped(network):
+    node_a = network.add_node('a:1')
+    register(node_a, 'missing:9')
+    assert resolve(node_a) == 'Our chain is authoritative.'
+
+
+def test_tampered_data_is_rejected(network):
+    node_a = network.add_node('a:1')
+    node_b = network.add_node('b:2')
+    node_b.post('/transactions/new', json={'patient_id': 'P1', 'details': 'Checkup'})
+    mine(node_b)
+    chain_before = chain_of(node_a)
+
+    body = node_b.get('/blocks/data?from=0&to=2').get_json()
+    body['data'][1][0]['details'] = 'Altered'
+    network.overrides[('b:2', '/blocks/data?from=0&to=2')] = (200, json.dumps(body).encode())
+
+    register(node_a, 'b:2')
+    assert resolve(node_a) == 'Our chain is authoritative.'
+    assert chain_of(node_a) == chain_before
+
+
+def test_data_that_is_not_a_list_is_rejected(network):
+    node_a = network.add_node('a:1')
+    node_b = network.add_node('b:2')
+    mine(node_b)
+
+    # A single record must not pass for a one-record list
+    body = node_b.get('/blocks/data?from=0&to=2').get_json()
+    body['data'][1] = body['data'][1][0]
+    network.overrides[('b:2', '/blocks/data?from=0&to=2')] = (200, json.dumps(body).encode())
+
+    register(node_a, 'b:2')
+    assert resolve(node_a) == 'Our chain is authoritative.'
+
+
+def test_missing_block_data_is_rejected(network):
+    node_a = network.add_node('a:1')
+    node_b = network.add_node('b:2')
+    mine(node_b)
+
+    body = node_b.get('/blocks/data?from=0&to=2').get_json()
+    body['data'] = body['data'][:1]
+    network.overrides[('b:2', '/blocks/data?from=0&to=2')] = (200, json.dumps(body).encode())
+
+    register(node_a, 'b:2')
+    assert resolve(node_a) == 'Our chain is authoritative.'
+
+
+def test_block_data_ranges(network):
+    node_a = network.add_node('a:1')
+    mine(node_a)
+    mine(node_a)
+    chain = chain_of(node_a)
+
+    body = node_a.get('/blocks/data?from=1').get_json()
+    assert body == {'from': 1, 'data': [block['data'] for block in chain[1:]]}
+    assert node_a.get('/blocks/data?from=1&to=2').get_json()['data'] == [chain[1]['data']]
+    assert node_a.get('/blocks/data?from=3').get_json()['data'] == []
+
+    assert node_a.get('/blocks/data').status_code == 400
+    assert node_a.get('/blocks/data?from=one').status_code == 400
+    assert node_a.get('/blocks/data?from=2&to=1').status_code == 400
+    assert node_a.get('/blocks/data?from=0&to=4').status_code == 404
+
+
+def test_tampered_header_field_is_rejected(network):
+    node_a = network.add_node('a:1')
+    node_b = network.add_node('b:2')
+    mine(node_b)
+
+    headers = node_b.get('/chain/headers').get_json()
+    headers['chain'][1]['timestamp'] += 1
+    network.overrides[('b:2', '/chain/headers')] = (200, json.dumps(headers).encode())
+
+    register(node_a, 'b:2')
+    assert resolve(node_a) == 'Our chain is authoritative.'
+
+
+def test_forged_fork_point_is_rejected(network):
+    node_a = network.add_node('a:1')
+    node_b = network.add_node('b:2')
+    mine(node_b)
+    register(node_a, 'b:2')
+    resolve(node_a)
+
+    # Keep block 1's hash, swap its proof for 0 and mine a block 2 on top
+    # of the swapped proof, one that doesn't hold against the real proof
+    headers = node_b.get('/chain/headers').get_json()['chain']
+    real_proof = headers[1]['proof']
+    headers[1]['proof'] = 0
+    proof = search_range(b'0', 2, 0, 1 << 20)
+    while check_proofs([(real_proof, proof)], proof_target(2)):
+        proof = search_range(b'0', 2, proof + 1, 1 << 20)
+    forged = Block(2, headers[1]['timestamp'] + 1, [], proof, headers[1]['hash'])
+    headers.append(forged.header_dict())
+
+    network.overrides[('b:2', '/chain/length')] = (200, b'{"length": 3}')
+    network.overrides[('b:2', '/chain/headers')] = (200, json.dumps({'chain': headers, 'length': 3}).encode())
+    network.overrides[('b:2', '/blocks/data?from=2&to=3')] = (200, b'{"from": 2, "data": [[]]}')
+
+    assert resolve(node_a) == 'Our chain is authoritative.'
+    assert len(chain_of(node_a)) == 2
+
+
+def test_bad_json_is_an_invalid_response(network):
+    node_a = network.add_node('a:1')
+    node_b = network.add_node('b:2')
+    mine(node_b)
+
+    network.overrides[('b:2', '/chain/headers')] = (200, b'not json')
+    register(node_a, 'b:2')
+    assert resolve(node_a) == 'Our chain is authoritative.'
+
+    network.overrides[('b:2', '/chain/length')] = (200, b'{"size": 5}')
+    assert resolve(node_a) == 'Our chain is authoritative.'
+
+
+def test_block_mined_during_sync_is_kept(network, monkeypatch):
+    node_a = network.add_node('a:1')
+    node_b = network.add_node('b:2')
+    mine(node_a)
+    mine(node_a)
+    for _ in range(3):
+        mine(node_b)
+
+    # Mine a block on node A while it is downloading node B's block data,
+    # which brings it level with node B
+    get = network.get
+    mining = threading.Lock()
+
+    def get_and_mine(url, timeout=None):
+        if '/data' in url and mining.acquire(blocking=False):
+            node_a.post('/transactions/new', json={'patient_id': 'IMPORTANT', 'details': 'Keep'})
+            mine(node_a)
+        return get(url, timeout)
+
+    monkeypatch.setattr(blockchain.session, 'get', get_and_mine)
+    register(node_a, 'b:2')
+    assert resolve(node_a) == 'Our chain is authoritative.'
+
+    chain = chain_of(node_a)
+    assert len(chain) == 4
+    assert chain[-1]['data'][0] == {'patient_id': 'IMPORTANT', 'details': 'Keep'}
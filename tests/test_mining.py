@@ -0,0 +1,58 @@
+import threading
+
+import pytest
+
+import api
+import blockchain
+from conftest import mine
+
+
+@pytest.fixture
+def held_mining(monkeypatch):
+    """
+    Holds every proof of work until the returned event is set.
+    """
+    release = threading.Event()
+    proof_of_work = blockchain.Blockchain.proof_of_work
+
+    def held(self, last_proof):
+        release.wait(10)
+        return proof_of_work(self, last_proof)
+
+    monkeypatch.setattr(blockchain.Blockchain, 'proof_of_work', held)
+    yield release
+    release.set()
+
+
+def test_mining_in_progress_is_not_queued_again(held_mining):
+    client = api.create_app().test_client()
+    client.post('/difficulty', json={'difficulty': 2})
+
+    first = client.get('/mine').get_json()
+    second = client.get('/mine').get_json()
+    assert second == {'message': 'Mining already in progress', 'job_id': first['job_id']}
+
+    held_mining.set()
+    assert mine(client)['index'] == 1
+    assert len(client.get('/chain').get_json()['chain']) == 2
+
+
+def test_finished_jobs_can_be_polled_again():
+    client = api.create_app().test_client()
+    client.post('/difficulty', json={'difficulty': 2})
+    job_id = client.get('/mine').get_json()['job_id']
+    while client.get(f'/mine/{job_id}').status_code == 202:
+        pass
+
+    assert client.get(f'/mine/{job_id}').status_code == 200
+
+
+def test_finished_jobs_expire(monkeypatch):
+    client = api.create_app().test_client()
+    client.post('/difficulty', json={'difficulty': 2})
+    job_id = client.get('/mine').get_json()['job_id']
+    while client.get(f'/mine/{job_id}').status_code == 202:
+        pass
+
+    monkeypatch.setattr(api, 'MINING_JOB_TTL', 0)
+    assert client.get(f'/mine/{job_id}').status_code == 404
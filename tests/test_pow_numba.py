@@ -0,0 +1,33 @@
+import pytest
+
+pytest.importorskip('numba')
+
+import blockchain
+import pow_numba
+
+# The hashed message is the prefix followed by the proof's digits, so these
+# lengths put the message either side of the 55- and 119-byte points where
+# SHA-256 padding spills into another 64-byte block
+PREFIX_LENGTHS = [1, 10, 40, 55, 56, 63, 64, 65, 100, 119, 120, 128, 200]
+
+STARTS = [0, 10 ** 15, 2 ** 63 - 5000]
+
+
+@pytest.mark.parametrize('prefix_length', PREFIX_LENGTHS)
+@pytest.mark.parametrize('difficulty', [0, 1, 2, 3, 65])
+@pytest.mark.parametrize('start', STARTS)
+def test_search_range_matches_hashlib(prefix_length, difficulty, start):
+    prefix = (b'1234567890' * 21)[:prefix_length]
+    stop = start + 4096
+    assert pow_numba.search_range(prefix, difficulty, start, stop) == blockchain.search_range(prefix, difficulty, start, stop)
+
+
+@pytest.mark.parametrize('difficulty', [0, 2])
+def test_empty_range_matches_hashlib(difficulty):
+    assert pow_numba.search_range(b'100', difficulty, 10, 10) is None
+    assert blockchain.search_range(b'100', difficulty, 10, 10) is None
+
+
+def test_find_nonce_matches_hashlib():
+    for last_proof in [100, 35293, 10 ** 18]:
+        assert blockchain.find_nonce(last_proof, 4, pow_numba.search_range) == blockchain.find_nonce(last_proof, 4)